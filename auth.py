@@ -2,136 +2,231 @@
 Authentication and authorization utilities
 """
 
-from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import asyncio
+import bcrypt
+import hashlib
+import hmac
+import math
+import os
+import statistics
+import time
+from datetime import timedelta
+from typing import List, Optional
+from cachetools import TTLCache
+import jwt
+from jwt import InvalidTokenError as JWTError
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
 from database import get_db, User
 
 # Security configuration
-SECRET_KEY = "your-secret-key-here-change-in-production"  # Change this in production!
+if os.environ.get("ENV") == "production" and not os.environ.get("JWT_SECRET"):
+    raise RuntimeError("JWT_SECRET must be set when ENV=production")
+SECRET_KEY = os.environ.get("JWT_SECRET", "your-secret-key-here-change-in-production")
 ALGORITHM = "HS256"
+# Encoded once and reused by every encode/decode
+SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
+ALGORITHMS = (ALGORITHM,)
+_DECODE_OPTIONS = {"require": ["exp", "sub"], "verify_aud": False}
+_JWT = jwt.PyJWT()
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 14
+LOGIN_HASH_BUDGET_MS = 90
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+bcrypt_rounds = BCRYPT_MIN_ROUNDS
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+_BEARER = "Bearer "
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+# 401 details shared by the auth dependencies
+_CREDS_DETAIL = "Could not validate credentials"
+_COOKIE_CREDS_DETAIL = "Could not validate credentials from cookie"
+_BEARER_CHALLENGE = {"WWW-Authenticate": "Bearer"}
 
-def get_password_hash(password: str) -> str:
-    """Generate password hash"""
-    return pwd_context.hash(password)
+# Short-lived caches for verified tokens and their users (kept well below token expiry)
+_token_cache = TTLCache(maxsize=10000, ttl=30)
+_user_cache = TTLCache(maxsize=5000, ttl=60)
+# Recently verified logins: username -> (hashed_password, HMAC of the password)
+_login_cache = TTLCache(maxsize=1024, ttl=30)
+
+def _credentials_exception(detail: str = _CREDS_DETAIL, headers: Optional[dict] = _BEARER_CHALLENGE) -> HTTPException:
+    """A fresh 401 for each failed request"""
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail, headers=headers)
+
+def _token_key(token: str) -> bytes:
+    """Cache key for a raw JWT (never store the token itself)"""
+    # 128 bits of the digest is plenty to avoid collisions and halves key size
+    return hashlib.sha256(token.encode()).digest()[:16]
+
+# Built once at import; SQLAlchemy reuses the compiled form from its statement cache
+_USER_STMT = select(User).where(User.username == bindparam("u"))
+
+def invalidate_user(username: str) -> None:
+    """Drop a cached user row and login (call after password changes or deactivation)"""
+    _user_cache.pop(username, None)
+    _login_cache.pop(username, None)
+
+def invalidate(token: str) -> None:
+    """Drop a token and its user from the verification caches (e.g. on logout)"""
+    payload = _token_cache.pop(_token_key(token), None)
+    if payload and payload.get("sub"):
+        invalidate_user(payload["sub"])
+
+def _check_password(plain_password: str, hashed_password: str) -> bool:
+    """Check a password against a bcrypt hash (unknown hash formats never match)"""
+    if not hashed_password.startswith(BCRYPT_PREFIXES):
+        return False
+    try:
+        # bcrypt only looks at the first 72 bytes
+        return bcrypt.checkpw(plain_password.encode("utf-8")[:72], hashed_password.encode("utf-8"))
+    except ValueError:
+        return False
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash (runs bcrypt off the event loop)"""
+    return await asyncio.to_thread(_check_password, plain_password, hashed_password)
+
+def get_password_hash(password: str, rounds: Optional[int] = None) -> str:
+    """Generate password hash (rounds overrides the calibrated cost, for test fixtures only)"""
+    salt = bcrypt.gensalt(rounds=rounds or bcrypt_rounds)
+    return bcrypt.hashpw(password.encode("utf-8")[:72], salt).decode("utf-8")
+
+def calibrate_password_hashing(target_ms: float = LOGIN_HASH_BUDGET_MS, samples: int = 3) -> int:
+    """Pick bcrypt rounds so one hash costs roughly target_ms on this machine.
+    
+    Login is the only path that pays the full bcrypt cost; authenticated
+    requests afterwards are served from the JWT cache.
+    """
+    global bcrypt_rounds
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        get_password_hash("calibration")
+        timings.append((time.perf_counter() - start) * 1000)
+    median_ms = statistics.median(timings)
+    
+    # Every extra bcrypt round doubles the cost
+    rounds = bcrypt_rounds + round(math.log2(target_ms / max(median_ms, 0.001)))
+    bcrypt_rounds = max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, rounds))
+    return bcrypt_rounds
 
 def get_user(db: Session, username: str) -> Optional[User]:
     """Get user by username"""
-    return db.query(User).filter(User.username == username).first()
+    return db.execute(_USER_STMT, {"u": username}).scalar_one_or_none()
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+def _credential_digest(username: str, password: str) -> bytes:
+    """Keyed digest of a credential pair, so plaintext passwords are never cached"""
+    return hmac.new(SECRET_KEY_BYTES, f"{username}:{password}".encode("utf-8"), hashlib.sha256).digest()
+
+async def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
     """Authenticate user with username and password"""
     user = get_user(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    
+    # Repeated logins within the TTL skip bcrypt; a changed password hash never matches
+    digest = _credential_digest(username, password)
+    cached = _login_cache.get(username)
+    if cached and cached[0] == user.hashed_password and hmac.compare_digest(cached[1], digest):
+        return user
+    
+    if not await verify_password(password, user.hashed_password):
         return None
+    _login_cache[username] = (user.hashed_password, digest)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode = dict(data)
+    # JWT "exp" is NumericDate seconds
+    to_encode["exp"] = int(time.time()) + int((expires_delta or timedelta(minutes=15)).total_seconds())
+    encoded_jwt = _JWT.encode(to_encode, SECRET_KEY_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get current authenticated user from Bearer token"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+def _decode_token(token: str) -> Optional[dict]:
+    """Decode and verify a JWT, reusing a cached payload where possible"""
+    key = _token_key(token)
+    payload = _token_cache.get(key)
+    if payload is None or payload.get("exp", 0) <= time.time():
+        try:
+            payload = _JWT.decode(token, SECRET_KEY_BYTES, algorithms=ALGORITHMS, options=_DECODE_OPTIONS)
+        except JWTError:
+            return None
+        _token_cache[key] = payload
+    return payload
+
+def _bearer_token(request: Request) -> Optional[str]:
+    """Get the raw token from the Bearer header, if any"""
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith(_BEARER):
+        return auth_header[len(_BEARER):]
+    return None
+
+def _token_from_request(request: Request) -> Optional[str]:
+    """Get the raw token from the Bearer header, falling back to the cookie"""
+    return _bearer_token(request) or request.cookies.get("access_token")
+
+def tokens_from_request(request: Request) -> List[str]:
+    """All raw tokens a request carries (cookie and Bearer header)"""
+    return [token for token in (request.cookies.get("access_token"), _bearer_token(request)) if token]
+
+def _verify_and_load(token: str, db: Session) -> Optional[User]:
+    """Decode a JWT and load its user, reusing cached results where possible"""
+    payload = _decode_token(token)
+    if payload is None:
+        return None
+    
+    username = payload.get("sub")
+    if not username:
+        return None
+    
+    user = _user_cache.get(username)
+    if user is not None:
+        # Attach the cached row to this request's session without a SELECT
+        return db.merge(user, load=False)
     
     user = get_user(db, username=username)
     if user is None:
-        raise credentials_exception
+        return None
+    # Cache a detached copy: a row left in this session would be expired by its commit,
+    # and every later merge would then refresh it with a SELECT
+    db.expunge(user)
+    _user_cache[username] = user
+    return db.merge(user, load=False)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Get current authenticated user from Bearer token"""
+    user = _verify_and_load(token, db)
+    if user is None:
+        raise _credentials_exception()
     return user
 
 async def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)):
     """Get current authenticated user from HTTP-only cookie"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials from cookie",
-    )
-    
     # Get token from cookie
     token = request.cookies.get("access_token")
     if not token:
-        raise credentials_exception
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        raise _credentials_exception(_COOKIE_CREDS_DETAIL, headers=None)
     
-    user = get_user(db, username=username)
+    user = _verify_and_load(token, db)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception(_COOKIE_CREDS_DETAIL, headers=None)
     return user
 
 async def get_current_user_flexible(request: Request, db: Session = Depends(get_db)):
     """Get current user from either Bearer token or cookie"""
-    # Try Bearer token first
-    auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ")[1]
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username: str = payload.get("sub")
-            if username:
-                user = get_user(db, username=username)
-                if user:
-                    return user
-        except JWTError:
-            pass
-    
-    # Try cookie if Bearer token failed
-    token = request.cookies.get("access_token")
-    if token:
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username: str = payload.get("sub")
-            if username:
-                user = get_user(db, username=username)
-                if user:
-                    return user
-        except JWTError:
-            pass
-    
-    raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-    )
+    # Prefer the Bearer token, fall back to the cookie; decode only once
+    token = _token_from_request(request)
+    user = _verify_and_load(token, db) if token else None
+    if user is None:
+        raise _credentials_exception()
+    return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user_flexible)):
     """Get current active user (supports both Bearer token and cookie)"""
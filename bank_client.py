@@ -5,52 +5,86 @@ Handles customer registration, account creation, and banking operations
 
 import httpx
 import logging
+import orjson
 from typing import Dict, Optional, Any, List
 from datetime import datetime
 import uuid
+from circuit_breaker import CircuitBreaker
+from timed_cache import TimedCache
 
 logger = logging.getLogger(__name__)
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+
 class DummyBankClient:
     """Client for communicating with the dummy bank API"""
     
     def __init__(self, bank_api_url: str = "http://127.0.0.1:3000"):
         self.bank_api_url = bank_api_url
         self.timeout = 10.0
+        # One pooled client for the lifetime of the app so connections are kept alive
+        self._client = httpx.AsyncClient(
+            base_url=bank_api_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=30)
+        )
+        # Skip calls for a while when the bank keeps failing instead of waiting on timeouts
+        self._breaker = CircuitBreaker()
+        self._status_cache = TimedCache()
+    
+    async def aclose(self):
+        """Close the pooled HTTP client"""
+        await self._client.aclose()
+    
+    async def _request(self, method: str, path: str, ok=(200,), not_found: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        """Send a request to the dummy bank and map the response to a status dict.
+        
+        Transport errors propagate so each caller can log them in its own context.
+        """
+        if self._breaker.is_open():
+            return {"status": "error", "error": "Dummy bank unavailable (circuit open)"}
+        
+        try:
+            response = await self._client.request(method, path, **kwargs)
+        except httpx.RequestError:
+            self._breaker.record_failure()
+            raise
+        self._breaker.record_response(response.status_code)
+        
+        if response.status_code in ok:
+            return {"status": "success", "data": orjson.loads(response.content)}
+        elif response.status_code == 404 and not_found is not None:
+            return {"status": "not_found", **not_found}
+        else:
+            return {
+                "status": "error", 
+                "error": f"Bank API error: {response.status_code}",
+                "details": response.text
+            }
     
     async def register_customer(self, customer_data: Dict[str, Any]) -> Dict[str, Any]:
         """Register a new customer in the dummy bank"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                # Map our data to dummy bank API format
-                request_data = {
-                    "name": customer_data.get("full_name") or customer_data.get("username"),
-                    "customer_oid": str(uuid.uuid4())  # Generate UUID for the customer
-                }
-                
-                logger.info(f"Registering customer in dummy bank: {request_data['name']}")
-                response = await client.post(
-                    f"{self.bank_api_url}/register-customer",
-                    json=request_data,
-                    headers={"Content-Type": "application/json"}
-                )
+            # Map our data to dummy bank API format
+            request_data = {
+                "name": customer_data.get("full_name") or customer_data.get("username"),
+                "customer_oid": str(uuid.uuid4())  # Generate UUID for the customer
+            }
+            
+            logger.info(f"Registering customer in dummy bank: {request_data['name']}")
+            result = await self._request(
+                "POST", "/register-customer", ok=(200, 201),
+                content=orjson.dumps(request_data),
+                headers=JSON_HEADERS
+            )
+            
+            if result["status"] == "success":
+                logger.info(f"Customer registered successfully: {result['data']}")
+                result["customer_oid"] = result["data"].get("customer_oid")
+            else:
+                logger.error(f"Failed to register customer: {result['error']} - {result.get('details')}")
+            return result
                 
-                if response.status_code in [200, 201]:
-                    result = response.json()
-                    logger.info(f"Customer registered successfully: {result}")
-                    return {
-                        "status": "success", 
-                        "data": result,
-                        "customer_oid": result.get("customer_oid")
-                    }
-                else:
-                    logger.error(f"Failed to register customer: {response.status_code} - {response.text}")
-                    return {
-                        "status": "error", 
-                        "error": f"Bank API error: {response.status_code}",
-                        "details": response.text
-                    }
-                    
         except Exception as e:
             logger.error(f"Error communicating with dummy bank: {e}")
             return {"status": "error", "error": str(e)}
@@ -58,21 +92,7 @@ class DummyBankClient:
     async def get_customer_portfolio(self, customer_oid: str) -> Dict[str, Any]:
         """Get comprehensive customer portfolio from dummy bank"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.bank_api_url}/user-portfolio/{customer_oid}")
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return {"status": "success", "data": result}
-                elif response.status_code == 404:
-                    return {"status": "not_found", "error": "Customer not found"}
-                else:
-                    return {
-                        "status": "error", 
-                        "error": f"Bank API error: {response.status_code}",
-                        "details": response.text
-                    }
-                    
+            return await self._request("GET", f"/user-portfolio/{customer_oid}", not_found={"error": "Customer not found"})
         except Exception as e:
             logger.error(f"Error getting portfolio from dummy bank: {e}")
             return {"status": "error", "error": str(e)}
@@ -80,21 +100,7 @@ class DummyBankClient:
     async def check_customer_exists(self, customer_oid: str) -> Dict[str, Any]:
         """Check if customer exists in dummy bank"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.bank_api_url}/customer/{customer_oid}/exists")
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return {"status": "success", "data": result}
-                elif response.status_code == 404:
-                    return {"status": "not_found", "exists": False}
-                else:
-                    return {
-                        "status": "error", 
-                        "error": f"Bank API error: {response.status_code}",
-                        "details": response.text
-                    }
-                    
+            return await self._request("GET", f"/customer/{customer_oid}/exists", not_found={"exists": False})
         except Exception as e:
             logger.error(f"Error checking customer existence: {e}")
             return {"status": "error", "error": str(e)}
@@ -102,19 +108,7 @@ class DummyBankClient:
     async def get_all_customers(self) -> Dict[str, Any]:
         """Get all customers from dummy bank"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(f"{self.bank_api_url}/customers")
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return {"status": "success", "data": result}
-                else:
-                    return {
-                        "status": "error", 
-                        "error": f"Bank API error: {response.status_code}",
-                        "details": response.text
-                    }
-                    
+            return await self._request("GET", "/customers")
         except Exception as e:
             logger.error(f"Error getting customers from dummy bank: {e}")
             return {"status": "error", "error": str(e)}
@@ -122,37 +116,33 @@ class DummyBankClient:
     async def delete_customer(self, customer_oid: str) -> Dict[str, Any]:
         """Delete customer from dummy bank"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.delete(f"{self.bank_api_url}/customer/{customer_oid}")
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    logger.info(f"Customer deleted successfully: {result}")
-                    return {"status": "success", "data": result}
-                elif response.status_code == 404:
-                    return {"status": "not_found", "error": "Customer not found"}
-                else:
-                    return {
-                        "status": "error", 
-                        "error": f"Bank API error: {response.status_code}",
-                        "details": response.text
-                    }
-                    
+            result = await self._request("DELETE", f"/customer/{customer_oid}", not_found={"error": "Customer not found"})
+            if result["status"] == "success":
+                logger.info(f"Customer deleted successfully: {result['data']}")
+            return result
         except Exception as e:
             logger.error(f"Error deleting customer from dummy bank: {e}")
             return {"status": "error", "error": str(e)}
     
     async def check_connection(self) -> Dict[str, Any]:
-        """Check if dummy bank API is available"""
+        """Check if dummy bank API is available (cached briefly for frequent health probes)"""
+        return await self._status_cache.get(self._probe_connection)
+    
+    async def _probe_connection(self) -> Dict[str, Any]:
+        """Call the dummy bank health endpoint"""
+        if self._breaker.is_open():
+            return {"status": "disconnected", "error": "Dummy bank unavailable (circuit open)"}
+        
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.bank_api_url}/health")
+            response = await self._client.get("/health", timeout=5.0)
+            self._breaker.record_response(response.status_code)
+            
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                return {"status": "connected", "data": result}
+            else:
+                return {"status": "error", "error": f"HTTP {response.status_code}"}
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return {"status": "connected", "data": result}
-                else:
-                    return {"status": "error", "error": f"HTTP {response.status_code}"}
-                    
         except Exception as e:
+            self._breaker.record_failure()
             return {"status": "disconnected", "error": str(e)}
\ No newline at end of file
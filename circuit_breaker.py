@@ -0,0 +1,37 @@
+"""
+Circuit breaker for calls to external services
+Stops waiting on timeouts for a service that is known to be down
+"""
+
+import time
+
+class CircuitBreaker:
+    """Short-circuits calls after repeated failures, backing off exponentially"""
+    
+    def __init__(self, failure_threshold: int = 3, max_cooldown: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.max_cooldown = max_cooldown
+        self._failures = 0
+        self._open_until = 0.0
+    
+    def is_open(self) -> bool:
+        """True while calls should be skipped"""
+        return time.monotonic() < self._open_until
+    
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        self._failures = 0
+        self._open_until = 0.0
+    
+    def record_failure(self):
+        """Count a failed call and open the circuit once the threshold is reached"""
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._open_until = time.monotonic() + min(2 ** self._failures, self.max_cooldown)
+    
+    def record_response(self, status_code: int):
+        """Count an HTTP response: a 5xx is a failure, anything else means the service is up"""
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
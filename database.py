@@ -2,9 +2,9 @@
 Database models and configuration for MCP Banking Backend
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, event, select, Index, Column, Integer, String, Float, DateTime, Boolean, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, selectinload, Session
 from datetime import datetime
 import os
 
@@ -13,8 +13,20 @@ SQLITE_DATABASE_URL = "sqlite:///./banking.db"
 
 engine = create_engine(
     SQLITE_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False},
+    query_cache_size=1200
 )
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL so readers don't block on the writer and commits skip the full fsync"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")  # 64 MB page cache
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -33,8 +45,8 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    # Relationship to accounts
-    accounts = relationship("Account", back_populates="owner")
+    # Relationship to accounts (never lazy-loaded; use get_user_with_accounts)
+    accounts = relationship("Account", back_populates="owner", lazy="raise")
 
 class Account(Base):
     """Account model"""
@@ -52,6 +64,10 @@ class Account(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     owner = relationship("User", back_populates="accounts")
     
+    __table_args__ = (
+        Index("ix_account_user_active", "user_id", "is_active"),
+    )
+    
     # Relationship to transactions
     sent_transactions = relationship("Transaction", foreign_keys="Transaction.from_account_id", back_populates="from_account")
     received_transactions = relationship("Transaction", foreign_keys="Transaction.to_account_id", back_populates="to_account")
@@ -73,6 +89,12 @@ class Transaction(Base):
     # Relationships
     from_account = relationship("Account", foreign_keys=[from_account_id], back_populates="sent_transactions")
     to_account = relationship("Account", foreign_keys=[to_account_id], back_populates="received_transactions")
+    
+    # Per-side indexes so account history is an index range scan ordered by date
+    __table_args__ = (
+        Index("ix_txn_from_created", "from_account_id", "created_at"),
+        Index("ix_txn_to_created", "to_account_id", "created_at"),
+    )
 
 # Database dependency
 def get_db():
@@ -83,126 +105,124 @@ def get_db():
     finally:
         db.close()
 
+def get_user_with_accounts(db: Session, username: str):
+    """Get user by username with accounts eagerly loaded in one extra IN query"""
+    return db.execute(
+        select(User).options(selectinload(User.accounts)).where(User.username == username)
+    ).scalar_one_or_none()
+
+def get_owned_account(db: Session, user_id: int, account_id: str, active_only: bool = True):
+    """Get an account only if it belongs to the given user (ownership checked in the same query)"""
+    query = db.query(Account).filter(Account.id == account_id, Account.user_id == user_id)
+    if active_only:
+        query = query.filter(Account.is_active == True)
+    return query.first()
+
 # Create tables
 def create_tables():
     """Create all database tables"""
     Base.metadata.create_all(bind=engine)
+    # create_all skips indexes on tables that already exist, so add any new ones explicitly
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 # Initialize database with sample data
-def init_sample_data():
-    """Initialize database with sample data"""
+async def init_sample_data():
+    """Initialize database with sample data (awaited from the app lifespan)"""
     from auth import get_password_hash
-    import uuid
     import asyncio
     import httpx
     
-    async def register_with_dummy_bank(name: str) -> str:
+    async def register_with_dummy_bank(client: httpx.AsyncClient, name: str) -> str:
         """Register customer with dummy bank and return CustomerOID"""
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    "http://127.0.0.1:3000/register-customer",
-                    json={"name": name},
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                if response.status_code in [200, 201]:
-                    result = response.json()
-                    return result.get("customer_oid")
-                else:
-                    print(f"Failed to register {name} with dummy bank: {response.status_code}")
-                    return None
-        except Exception as e:
-            print(f"Error registering {name} with dummy bank: {e}")
-            return None
-    
-    async def init_data_async():
-        """Async function to initialize data with dummy bank integration"""
-        db = SessionLocal()
-        try:
-            # Check if data already exists
-            if db.query(User).first():
-                print("Sample data already exists, skipping initialization")
-                return
-            
-            print("Initializing sample data with dummy bank integration...")
-            
-            # Register sample users with dummy bank and get CustomerOIDs
-            john_customer_oid = await register_with_dummy_bank("John Doe")
-            jane_customer_oid = await register_with_dummy_bank("Jane Smith")
-            
-            # Create sample users with CustomerOIDs from dummy bank
-            user1 = User(
-                username="john_doe",
-                email="john@example.com",
-                hashed_password=get_password_hash("password123"),
-                full_name="John Doe",
-                customer_oid=john_customer_oid
+            response = await client.post(
+                "http://127.0.0.1:3000/register-customer",
+                json={"name": name},
+                headers={"Content-Type": "application/json"}
             )
-            user2 = User(
-                username="jane_smith",
-                email="jane@example.com", 
-                hashed_password=get_password_hash("password123"),
-                full_name="Jane Smith",
-                customer_oid=jane_customer_oid
-            )
-            
-            db.add(user1)
-            db.add(user2)
-            db.commit()
-            db.refresh(user1)
-            db.refresh(user2)
-            
-            print(f"Created users - John: {john_customer_oid}, Jane: {jane_customer_oid}")
-            
-            # Create sample accounts
-            accounts = [
-                Account(id="ACC001", account_name="John's Checking", account_type="checking", 
-                       balance=5000.0, user_id=user1.id),
-                Account(id="ACC002", account_name="John's Savings", account_type="savings", 
-                       balance=15000.0, user_id=user1.id),
-                Account(id="ACC003", account_name="Jane's Checking", account_type="checking", 
-                       balance=3000.0, user_id=user2.id),
-                Account(id="ACC004", account_name="Jane's Savings", account_type="savings", 
-                       balance=8000.0, user_id=user2.id),
-            ]
-            
-            for account in accounts:
-                db.add(account)
-            
-            db.commit()
-            
-            # Create sample transactions
-            transactions = [
-                Transaction(id="TXN001", from_account_id="ACC001", amount=50.0, 
-                           description="ATM Withdrawal", transaction_type="withdrawal", status="completed"),
-                Transaction(id="TXN002", to_account_id="ACC001", amount=1000.0, 
-                           description="Salary Deposit", transaction_type="deposit", status="completed"),
-                Transaction(id="TXN003", from_account_id="ACC001", to_account_id="ACC003", 
-                           amount=200.0, description="Transfer to Jane", transaction_type="transfer", status="completed"),
-            ]
-            
-            for transaction in transactions:
-                db.add(transaction)
-            
-            db.commit()
-            print("Sample data initialized successfully with dummy bank integration")
             
+            if response.status_code in [200, 201]:
+                result = response.json()
+                return result.get("customer_oid")
+            else:
+                print(f"Failed to register {name} with dummy bank: {response.status_code}")
+                return None
         except Exception as e:
-            print(f"Error initializing sample data: {e}")
-            db.rollback()
-        finally:
-            db.close()
+            print(f"Error registering {name} with dummy bank: {e}")
+            return None
     
-    # Run the async initialization
+    db = SessionLocal()
     try:
-        asyncio.run(init_data_async())
-    except RuntimeError:
-        # If we're already in an async context, use current loop
-        import threading
-        def run_in_thread():
-            asyncio.run(init_data_async())
+        # Check if data already exists
+        if db.query(User).first():
+            print("Sample data already exists, skipping initialization")
+            return
+        
+        print("Initializing sample data with dummy bank integration...")
+        
+        # Register sample users with dummy bank concurrently over one connection pool,
+        # hashing the shared seed password in a worker thread meanwhile
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            seed_password_hash, john_customer_oid, jane_customer_oid = await asyncio.gather(
+                asyncio.to_thread(get_password_hash, "password123"),
+                register_with_dummy_bank(client, "John Doe"),
+                register_with_dummy_bank(client, "Jane Smith"),
+            )
         
-        thread = threading.Thread(target=run_in_thread)
-        thread.start()
-        thread.join()
+        # Create sample users with CustomerOIDs from dummy bank
+        user1 = User(
+            username="john_doe",
+            email="john@example.com",
+            hashed_password=seed_password_hash,
+            full_name="John Doe",
+            customer_oid=john_customer_oid
+        )
+        user2 = User(
+            username="jane_smith",
+            email="jane@example.com", 
+            hashed_password=seed_password_hash,
+            full_name="Jane Smith",
+            customer_oid=jane_customer_oid
+        )
+        
+        # Flush assigns primary keys without committing; everything commits once below
+        db.add_all([user1, user2])
+        db.flush()
+        
+        print(f"Created users - John: {john_customer_oid}, Jane: {jane_customer_oid}")
+        
+        # Create sample accounts
+        accounts = [
+            Account(id="ACC001", account_name="John's Checking", account_type="checking", 
+                   balance=5000.0, user_id=user1.id),
+            Account(id="ACC002", account_name="John's Savings", account_type="savings", 
+                   balance=15000.0, user_id=user1.id),
+            Account(id="ACC003", account_name="Jane's Checking", account_type="checking", 
+                   balance=3000.0, user_id=user2.id),
+            Account(id="ACC004", account_name="Jane's Savings", account_type="savings", 
+                   balance=8000.0, user_id=user2.id),
+        ]
+        
+        db.add_all(accounts)
+        
+        # Create sample transactions
+        transactions = [
+            Transaction(id="TXN001", from_account_id="ACC001", amount=50.0, 
+                       description="ATM Withdrawal", transaction_type="withdrawal", status="completed"),
+            Transaction(id="TXN002", to_account_id="ACC001", amount=1000.0, 
+                       description="Salary Deposit", transaction_type="deposit", status="completed"),
+            Transaction(id="TXN003", from_account_id="ACC001", to_account_id="ACC003", 
+                       amount=200.0, description="Transfer to Jane", transaction_type="transfer", status="completed"),
+        ]
+        
+        db.add_all(transactions)
+        db.commit()
+        print("Sample data initialized successfully with dummy bank integration")
+        
+    except Exception as e:
+        print(f"Error initializing sample data: {e}")
+        db.rollback()
+    finally:
+        db.close()
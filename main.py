@@ -1,24 +1,64 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.security import OAuth2PasswordRequestForm
 import httpx
+import orjson
+import secrets
 
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import Depends, HTTPException, status, Response
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from fastapi import Depends, HTTPException, Query, status, Request, Response
+from sqlalchemy import text, tuple_, update
+from sqlalchemy.orm import Session, raiseload
 from datetime import timedelta, datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import uvicorn
 from database import User, Account, Transaction
-from schemas import UserCreate, UserResponse, Token, AccountListResponse, AccountResponse, TransactionResponse
-from database import get_db, create_tables, init_sample_data
-from auth import authenticate_user, create_access_token, get_current_active_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from schemas import UserCreate, UserResponse, Token, AccountListResponse, AccountResponse, TransactionResponse, TransferRequest, AccountListAdapter, TransactionListAdapter
+from database import get_db, get_owned_account, create_tables, init_sample_data
+from auth import authenticate_user, calibrate_password_hashing, create_access_token, get_current_active_user, invalidate, tokens_from_request, ACCESS_TOKEN_EXPIRE_MINUTES
 from bank_client import DummyBankClient
+from circuit_breaker import CircuitBreaker
+from timed_cache import TimedCache
 from logging import getLogger
 
 logger = getLogger(__name__)
 
-app = FastAPI()
+MCP_SERVER_URL = "http://localhost:8001"
+# Agent queries can run for minutes, but connecting should fail fast
+MCP_QUERY_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Shared HTTP clients, created in the app lifespan
+bank_client: DummyBankClient = None
+mcp_client: httpx.AsyncClient = None
+mcp_breaker = CircuitBreaker()
+mcp_status_cache = TimedCache()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize database and shared clients on startup, release them on shutdown"""
+    global bank_client, mcp_client
+    create_tables()
+    await init_sample_data()
+    logger.info("Database initialized successfully")
+    rounds = await asyncio.to_thread(calibrate_password_hashing)
+    logger.info(f"Password hashing calibrated to {rounds} bcrypt rounds")
+    bank_client = DummyBankClient()
+    mcp_client = httpx.AsyncClient(
+        base_url=MCP_SERVER_URL,
+        timeout=MCP_QUERY_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+    )
+    try:
+        yield
+    finally:
+        await mcp_client.aclose()
+        await bank_client.aclose()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 origins = [
     "http://localhost",
@@ -32,25 +72,18 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
-    allow_methods=["*"], # veya spesifik olarak ["GET", "POST"]
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400, # Tarayıcılar preflight (OPTIONS) yanıtını 1 gün önbelleğe alır
 )
-# Startup event to initialize database
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database on startup"""
-    create_tables()
-    init_sample_data()
-    logger.info("Database initialized successfully")
-
 # Authentication endpoints
 @app.post("/register", response_model=UserResponse)
 async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new user and sync with dummy bank"""
     # Check if user already exists
-    existing_user = db.query(User).filter(
+    existing_user = db.query(User.id).filter(
         (User.username == user.username) | (User.email == user.email)
-    ).first()
+    ).limit(1).scalar()
     
     if existing_user:
         raise HTTPException(
@@ -77,7 +110,7 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     
     # Create new user in local database
     from auth import get_password_hash
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await asyncio.to_thread(get_password_hash, user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -93,6 +126,43 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     logger.info(f"New user registered: {user.username}")
     return db_user
 
+def _login_response(response: Response, user: User) -> Dict[str, str]:
+    """Create an access token for the user and also set it as an HTTP-only cookie"""
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.username}, expires_delta=access_token_expires
+    )
+    
+    # Set HTTP-only cookie
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,  # Convert to seconds
+        expires=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        samesite="lax",
+        secure=False  # Set to True in production with HTTPS
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@app.post("/token", response_model=Token)
+async def login_user(
+    response: Response,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db)
+):
+    """Login user with form data (OAuth2 password flow) and return access token + set HTTP-only cookie"""
+    user = await authenticate_user(db, form_data.username, form_data.password)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    logger.info(f"User logged in: {user.username}")
+    return _login_response(response, user)
+
 @app.post("/login", response_model=Token)
 async def login_user_json(
     response: Response,
@@ -109,7 +179,7 @@ async def login_user_json(
             detail="Username and password are required"
         )
     
-    user = authenticate_user(db, username, password)
+    user = await authenticate_user(db, username, password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -117,28 +187,14 @@ async def login_user_json(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    
-    # Set HTTP-only cookie
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60,  # Convert to seconds
-        expires=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        samesite="lax",
-        secure=False  # Set to True in production with HTTPS
-    )
-    
     logger.info(f"User logged in via JSON: {user.username}")
-    return {"access_token": access_token, "token_type": "bearer"}
+    return _login_response(response, user)
 
 @app.post("/logout")
-async def logout_user(response: Response):
+async def logout_user(request: Request, response: Response):
     """Logout user by clearing the HTTP-only cookie"""
+    for token in tokens_from_request(request):
+        invalidate(token)
     response.delete_cookie(key="access_token")
     return {"message": "Successfully logged out"}
 
@@ -149,12 +205,18 @@ async def get_user_accounts(
     db: Session = Depends(get_db)
 ):
     """Get current user's accounts"""
-    accounts = db.query(Account).filter(
+    # AccountResponse needs no relationships; raiseload turns any accidental N+1 into an error
+    accounts = db.query(Account).options(raiseload("*")).filter(
         Account.user_id == current_user.id,
         Account.is_active == True
     ).all()
     
-    return {"accounts": accounts}
+    # Validate and serialize the whole list in pydantic-core in one pass; AccountListResponse
+    # only documents the shape, so no wrapper instance is built per request
+    return Response(
+        content=b'{"accounts":' + AccountListAdapter.dump_json(AccountListAdapter.validate_python(accounts)) + b"}",
+        media_type="application/json"
+    )
 
 @app.get("/accounts/{account_id}", response_model=AccountResponse)
 async def get_account_details(
@@ -163,11 +225,7 @@ async def get_account_details(
     db: Session = Depends(get_db)
 ):
     """Get specific account details"""
-    account = db.query(Account).filter(
-        Account.id == account_id,
-        Account.user_id == current_user.id,
-        Account.is_active == True
-    ).first()
+    account = get_owned_account(db, current_user.id, account_id)
     
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
@@ -181,11 +239,7 @@ async def get_account_balance(
     db: Session = Depends(get_db)
 ):
     """Get account balance"""
-    account = db.query(Account).filter(
-        Account.id == account_id,
-        Account.user_id == current_user.id,
-        Account.is_active == True
-    ).first()
+    account = get_owned_account(db, current_user.id, account_id)
     
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
@@ -200,27 +254,126 @@ async def get_account_balance(
 @app.get("/accounts/{account_id}/transactions", response_model=List[TransactionResponse])
 async def get_account_transactions(
     account_id: str,
-    limit: int = 10,
+    limit: int = Query(10, ge=1, le=200),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get account transactions"""
+    """Get account transactions, newest first.
+    
+    Pages are keyset-based: pass the X-Next-Cursor header of a full page as
+    `cursor` to get the next one.
+    """
     # Verify account ownership
-    account = db.query(Account).filter(
-        Account.id == account_id,
-        Account.user_id == current_user.id
-    ).first()
+    account = get_owned_account(db, current_user.id, account_id, active_only=False)
     
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     
-    # Get transactions for this account
-    transactions = db.query(Transaction).filter(
-        (Transaction.from_account_id == account_id) | 
-        (Transaction.to_account_id == account_id)
-    ).order_by(Transaction.created_at.desc()).limit(limit).all()
+    # Cursor is "<created_at iso>|<transaction id>" of the last row already seen
+    after = None
+    if cursor:
+        try:
+            created_at, transaction_id = cursor.split("|", 1)
+            after = (datetime.fromisoformat(created_at), transaction_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # Get transactions for this account: SQLite can't use an index for an OR across
+    # two columns, so read each side from its own index and merge the two short lists
+    def page(side_filter):
+        query = db.query(Transaction).filter(side_filter)
+        if after:
+            query = query.filter(tuple_(Transaction.created_at, Transaction.id) < after)
+        return query.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(limit).all()
+    
+    sent = page(Transaction.from_account_id == account_id)
+    received = page(Transaction.to_account_id == account_id)
+    
+    unique = {transaction.id: transaction for transaction in sent + received}
+    transactions = sorted(unique.values(), key=lambda t: (t.created_at, t.id), reverse=True)[:limit]
+    
+    # Validate and serialize the whole list in pydantic-core in one pass
+    response = Response(
+        content=TransactionListAdapter.dump_json(TransactionListAdapter.validate_python(transactions)),
+        media_type="application/json"
+    )
+    if len(transactions) == limit:
+        last = transactions[-1]
+        response.headers["X-Next-Cursor"] = f"{last.created_at.isoformat()}|{last.id}"
+    return response
+
+@app.post("/transfer", response_model=TransactionResponse)
+async def transfer_money(
+    from_account_id: str,
+    transfer: TransferRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Transfer money between accounts"""
+    if transfer.amount <= 0:
+        raise HTTPException(status_code=400, detail="Transfer amount must be positive")
+    if from_account_id == transfer.to_account_id:
+        raise HTTPException(status_code=400, detail="Cannot transfer to the same account")
+    
+    # Debit atomically: ownership, active flag, currency and funds are checked by the UPDATE itself
+    debit = db.execute(
+        update(Account)
+        .where(
+            Account.id == from_account_id,
+            Account.user_id == current_user.id,
+            Account.is_active == True,
+            Account.currency == transfer.currency,
+            Account.balance >= transfer.amount
+        )
+        .values(balance=Account.balance - transfer.amount)
+    )
+    if debit.rowcount != 1:
+        db.rollback()
+        source = get_owned_account(db, current_user.id, from_account_id)
+        if not source:
+            raise HTTPException(status_code=404, detail="Account not found")
+        if source.currency != transfer.currency:
+            raise HTTPException(status_code=400, detail="Transfer currency does not match the source account currency")
+        raise HTTPException(status_code=400, detail="Insufficient funds")
+    
+    # Amounts are not converted, so the destination must hold the same currency
+    credit = db.execute(
+        update(Account)
+        .where(
+            Account.id == transfer.to_account_id,
+            Account.is_active == True,
+            Account.currency == transfer.currency
+        )
+        .values(balance=Account.balance + transfer.amount)
+    )
+    if credit.rowcount != 1:
+        db.rollback()
+        destination_currency = db.query(Account.currency).filter(
+            Account.id == transfer.to_account_id,
+            Account.is_active == True
+        ).scalar()
+        if destination_currency is None:
+            raise HTTPException(status_code=404, detail="Destination account not found")
+        raise HTTPException(status_code=400, detail="Transfer currency does not match the destination account currency")
+    
+    transaction = Transaction(
+        # 48 random bits
+        id=f"TXN{secrets.token_hex(6).upper()}",
+        from_account_id=from_account_id,
+        to_account_id=transfer.to_account_id,
+        amount=transfer.amount,
+        currency=transfer.currency,
+        description=transfer.description,
+        transaction_type="transfer",
+        status="completed"
+    )
+    db.add(transaction)
+    db.commit()
+    db.refresh(transaction)
     
-    return transactions
+    logger.info(f"Transfer {transaction.id}: {from_account_id} -> {transfer.to_account_id} ({transfer.amount})")
+    return transaction
 
 
 @app.post("/mcp/query")
@@ -235,34 +388,80 @@ async def query_mcp(
 
     print(f"Received query from user {current_user.username}: {query}")
 
-    # Define a longer timeout for this specific request
-    timeout_config = httpx.Timeout(600.0, connect=5.0)
+    if mcp_breaker.is_open():
+        raise HTTPException(
+            status_code=503, # Service Unavailable
+            detail="The agent is currently unavailable. Please try again later."
+        )
 
     try:
-        async with httpx.AsyncClient(timeout=timeout_config) as client:
-            response = await client.post(
-                "http://localhost:8001/master-agent",
-                json={"query": query, "oid": current_user.customer_oid}
-            )
+        response = await mcp_client.post(
+            "/master-agent",
+            content=orjson.dumps({"query": query, "oid": current_user.customer_oid}),
+            headers=JSON_HEADERS
+        )
+        mcp_breaker.record_response(response.status_code)
 
-            # Raise an exception for bad status codes (4xx or 5xx)
-            response.raise_for_status()
+        # Raise an exception for bad status codes (4xx or 5xx)
+        response.raise_for_status()
 
-            # Return the JSON payload from the response
-            return response.json()
+        # Return the JSON payload from the response
+        return orjson.loads(response.content)
 
     except httpx.ReadTimeout:
+        mcp_breaker.record_failure()
         raise HTTPException(
             status_code=504, # Gateway Timeout
             detail="The request to the agent timed out. Please try again later."
         )
     except httpx.RequestError as exc:
         # Catch other potential request errors (e.g., connection refused)
+        mcp_breaker.record_failure()
         raise HTTPException(
             status_code=503, # Service Unavailable
             detail=f"An error occurred while communicating with the agent: {exc}"
         )
         
+async def check_mcp_status() -> Dict[str, str]:
+    """Check if the MCP agent server is reachable (cached briefly for frequent health probes)"""
+    return await mcp_status_cache.get(_probe_mcp_status)
+
+async def _probe_mcp_status() -> Dict[str, str]:
+    """Call the MCP server health endpoint"""
+    try:
+        response = await mcp_client.get("/health", timeout=5.0)
+        mcp_breaker.record_response(response.status_code)
+        if response.status_code == 200:
+            return {"status": "connected", "url": MCP_SERVER_URL}
+        return {"status": "error", "url": MCP_SERVER_URL, "error": f"HTTP {response.status_code}"}
+    except Exception as e:
+        mcp_breaker.record_failure()
+        return {"status": "disconnected", "url": MCP_SERVER_URL, "error": str(e)}
+
+@app.get("/health")
+async def health_check(db: Session = Depends(get_db)):
+    """Health check including database, MCP server and dummy bank status"""
+    try:
+        db.execute(text("SELECT 1"))
+        database_status = "connected"
+    except Exception as e:
+        database_status = f"error: {e}"
+    
+    # Probe both upstreams concurrently so latency is the slower one, not the sum
+    mcp_status, bank_status = await asyncio.gather(
+        check_mcp_status(),
+        bank_client.check_connection()
+    )
+    
+    return {
+        "status": "healthy",
+        "service": "mcp-banking-backend",
+        "timestamp": datetime.now().isoformat(),
+        "database": database_status,
+        "mcp_server": mcp_status,
+        "dummy_bank": {**bank_status, "url": bank_client.bank_api_url}
+    }
+
 @app.get("/me")
 async def get_current_user(
     current_user: User = Depends(get_current_active_user)
@@ -271,4 +470,5 @@ async def get_current_user(
     return current_user.customer_oid
         
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # loop="auto" runs on uvloop wherever it is installed (it is not available on Windows)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, loop="auto")
\ No newline at end of file
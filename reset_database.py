@@ -6,133 +6,76 @@ Resets the local database and re-seeds it with data from dummy bank
 import asyncio
 import httpx
 import os
-from database import engine, Base, SessionLocal, User, Account, Transaction
-from auth import get_password_hash
+from pathlib import Path
+from typing import List, Optional
 
-async def reset_database_with_dummy_bank():
-    """Reset database and initialize with dummy bank integration"""
-    
-    # Remove existing database file
-    db_file = "banking.db"
-    if os.path.exists(db_file):
-        os.remove(db_file)
-        print(f"✅ Removed existing database: {db_file}")
-    
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
-    print("✅ Created database tables")
-    
-    async def register_with_dummy_bank(name: str) -> str:
-        """Register customer with dummy bank and return CustomerOID"""
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                print(f"🏛️ Registering '{name}' with dummy bank...")
-                response = await client.post(
-                    "http://127.0.0.1:3000/register-customer",
-                    json={"name": name},
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                if response.status_code in [200, 201]:
-                    result = response.json()
-                    customer_oid = result.get("customer_oid")
-                    print(f"   ✅ Registered: {customer_oid}")
-                    return customer_oid
-                else:
-                    print(f"   ❌ Failed: {response.status_code} - {response.text}")
-                    return None
-        except Exception as e:
-            print(f"   ❌ Error: {e}")
-            return None
-    
-    # Check dummy bank connection first
-    print("🏛️ Checking dummy bank connection...")
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get("http://127.0.0.1:3000/health")
-            if response.status_code == 200:
-                health = response.json()
-                print(f"   ✅ Dummy bank is running: {health.get('status')}")
-            else:
-                print(f"   ❌ Dummy bank health check failed: {response.status_code}")
-                return
-    except Exception as e:
-        print(f"   ❌ Cannot connect to dummy bank: {e}")
-        print("   Please make sure dummy bank is running on http://127.0.0.1:3000")
-        return
-    
-    # Register sample users with dummy bank
-    print("\n📝 Registering sample users with dummy bank...")
-    john_customer_oid = await register_with_dummy_bank("John Doe")
-    jane_customer_oid = await register_with_dummy_bank("Jane Smith")
-    
-    if not john_customer_oid or not jane_customer_oid:
-        print("❌ Failed to register users with dummy bank")
-        return
+# FAST_SEED=1 hashes the seed password with bcrypt's minimum cost. Test/dev databases only:
+# these hashes are cheap to brute-force. Otherwise auth's default BCRYPT_MIN_ROUNDS is used;
+# the app's startup calibration does not run in this script.
+SEED_BCRYPT_ROUNDS = 4 if os.environ.get("FAST_SEED") == "1" else None
+
+def write_local_seed(john_customer_oid: str, jane_customer_oid: str, seed_password_hash: str):
+    """Create the local users, accounts and transactions in a single transaction"""
+    from database import SessionLocal, User, Account, Transaction
     
-    # Create local database entries
-    print("\n💾 Creating local database entries...")
     db = SessionLocal()
     try:
         # Create sample users with CustomerOIDs from dummy bank
         user1 = User(
             username="john_doe",
             email="john@example.com",
-            hashed_password=get_password_hash("password123"),
+            hashed_password=seed_password_hash,
             full_name="John Doe",
             customer_oid=john_customer_oid
         )
         user2 = User(
             username="jane_smith",
             email="jane@example.com", 
-            hashed_password=get_password_hash("password123"),
+            hashed_password=seed_password_hash,
             full_name="Jane Smith",
             customer_oid=jane_customer_oid
         )
         
-        db.add(user1)
-        db.add(user2)
-        db.commit()
-        db.refresh(user1)
-        db.refresh(user2)
+        db.add_all([user1, user2])
+        # Flush only to get the user IDs; everything is committed once at the end
+        db.flush()
         
         print(f"   ✅ Created user: {user1.username} (ID: {user1.id}, CustomerOID: {john_customer_oid})")
         print(f"   ✅ Created user: {user2.username} (ID: {user2.id}, CustomerOID: {jane_customer_oid})")
         
         # Create sample accounts
         accounts = [
-            Account(id="ACC001", account_name="John's Checking", account_type="checking", 
-                   balance=5000.0, user_id=user1.id),
-            Account(id="ACC002", account_name="John's Savings", account_type="savings", 
-                   balance=15000.0, user_id=user1.id),
-            Account(id="ACC003", account_name="Jane's Checking", account_type="checking", 
-                   balance=3000.0, user_id=user2.id),
-            Account(id="ACC004", account_name="Jane's Savings", account_type="savings", 
-                   balance=8000.0, user_id=user2.id),
+            {"id": "ACC001", "account_name": "John's Checking", "account_type": "checking",
+             "balance": 5000.0, "user_id": user1.id},
+            {"id": "ACC002", "account_name": "John's Savings", "account_type": "savings",
+             "balance": 15000.0, "user_id": user1.id},
+            {"id": "ACC003", "account_name": "Jane's Checking", "account_type": "checking",
+             "balance": 3000.0, "user_id": user2.id},
+            {"id": "ACC004", "account_name": "Jane's Savings", "account_type": "savings",
+             "balance": 8000.0, "user_id": user2.id},
         ]
         
-        for account in accounts:
-            db.add(account)
-            print(f"   ✅ Created account: {account.account_name} ({account.id})")
-        
-        db.commit()
-        
-        # Create sample transactions
+        # Create sample transactions (executemany needs the same keys in every row)
         transactions = [
-            Transaction(id="TXN001", from_account_id="ACC001", amount=50.0, 
-                       description="ATM Withdrawal", transaction_type="withdrawal", status="completed"),
-            Transaction(id="TXN002", to_account_id="ACC001", amount=1000.0, 
-                       description="Salary Deposit", transaction_type="deposit", status="completed"),
-            Transaction(id="TXN003", from_account_id="ACC001", to_account_id="ACC003", 
-                       amount=200.0, description="Transfer to Jane", transaction_type="transfer", status="completed"),
+            {"id": "TXN001", "from_account_id": "ACC001", "to_account_id": None, "amount": 50.0,
+             "description": "ATM Withdrawal", "transaction_type": "withdrawal", "status": "completed"},
+            {"id": "TXN002", "from_account_id": None, "to_account_id": "ACC001", "amount": 1000.0,
+             "description": "Salary Deposit", "transaction_type": "deposit", "status": "completed"},
+            {"id": "TXN003", "from_account_id": "ACC001", "to_account_id": "ACC003",
+             "amount": 200.0, "description": "Transfer to Jane", "transaction_type": "transfer", "status": "completed"},
         ]
         
-        for transaction in transactions:
-            db.add(transaction)
-            print(f"   ✅ Created transaction: {transaction.id} ({transaction.transaction_type})")
-        
+        # Core executemany on the session's connection: no ORM bookkeeping, same transaction
+        db.execute(Account.__table__.insert(), accounts)
+        db.execute(Transaction.__table__.insert(), transactions)
         db.commit()
         
+        # Report all seeded rows in one write
+        print("\n".join(
+            [f"   ✅ Created account: {account['account_name']} ({account['id']})" for account in accounts]
+            + [f"   ✅ Created transaction: {transaction['id']} ({transaction['transaction_type']})" for transaction in transactions]
+        ))
+        
         print(f"\n🎉 Database reset and seeded successfully!")
         print(f"📊 Created:")
         print(f"   - 2 users (with dummy bank CustomerOIDs)")
@@ -149,6 +92,115 @@ async def reset_database_with_dummy_bank():
     finally:
         db.close()
 
+async def reset_database_with_dummy_bank():
+    """Reset database and initialize with dummy bank integration"""
+    
+    async def register_with_dummy_bank(client: httpx.AsyncClient, name: str) -> str:
+        """Register customer with dummy bank and return CustomerOID"""
+        try:
+            print(f"🏛️ Registering '{name}' with dummy bank...")
+            response = await client.post(
+                "http://127.0.0.1:3000/register-customer",
+                json={"name": name},
+                headers={"Content-Type": "application/json"}
+            )
+            
+            if response.status_code in [200, 201]:
+                result = response.json()
+                customer_oid = result.get("customer_oid")
+                print(f"   ✅ Registered '{name}': {customer_oid}")
+                return customer_oid
+            else:
+                print(f"   ❌ Failed: {response.status_code} - {response.text}")
+                return None
+        except Exception as e:
+            print(f"   ❌ Error: {e}")
+            return None
+    
+    async def register_customers(client: httpx.AsyncClient, names: List[str], batch_supported: bool) -> List[Optional[str]]:
+        """Register all customers, in a single call when the dummy bank supports batches"""
+        if batch_supported:
+            try:
+                print(f"🏛️ Registering {len(names)} customers with dummy bank in one batch...")
+                response = await client.post(
+                    "http://127.0.0.1:3000/register-customers",
+                    json={"customers": [{"name": name} for name in names]},
+                    headers={"Content-Type": "application/json"}
+                )
+                
+                if response.status_code in [200, 201]:
+                    # Results come back in request order
+                    customer_oids = [customer.get("customer_oid") for customer in response.json().get("customers", [])]
+                    if len(customer_oids) == len(names):
+                        for name, customer_oid in zip(names, customer_oids):
+                            print(f"   ✅ Registered '{name}': {customer_oid}")
+                        return customer_oids
+                print(f"   ⚠️ Batch registration failed ({response.status_code}), registering one by one")
+            except Exception as e:
+                print(f"   ⚠️ Batch registration error: {e}, registering one by one")
+        
+        # Older dummy banks: one request per customer, sent concurrently
+        return await asyncio.gather(*(register_with_dummy_bank(client, name) for name in names))
+    
+    # One client for the health check and all registrations, so they share a kept-alive connection
+    limits = httpx.Limits(max_keepalive_connections=20, keepalive_expiry=30)
+    async with httpx.AsyncClient(timeout=10.0, limits=limits) as client:
+        # Check dummy bank connection first
+        print("🏛️ Checking dummy bank connection...")
+        try:
+            response = await client.get("http://127.0.0.1:3000/health", timeout=5.0)
+            if response.status_code == 200:
+                health = response.json()
+                print(f"   ✅ Dummy bank is running: {health.get('status')}")
+            else:
+                print(f"   ❌ Dummy bank health check failed: {response.status_code}")
+                return
+        except Exception as e:
+            print(f"   ❌ Cannot connect to dummy bank: {e}")
+            print("   Please make sure dummy bank is running on http://127.0.0.1:3000")
+            return
+        
+        # SQLAlchemy and bcrypt are only imported once the dummy bank is known to be up,
+        # and the existing database is only removed then too
+        from database import engine, Base
+        from auth import get_password_hash
+        
+        # Same file the app's engine points at
+        db_path = Path(engine.url.database)
+        
+        # Remove existing database file
+        try:
+            db_path.unlink()
+            print(f"✅ Removed existing database: {db_path}")
+        except FileNotFoundError:
+            pass
+        # WAL mode keeps sidecar files next to the database
+        for suffix in ("-wal", "-shm"):
+            db_path.with_name(db_path.name + suffix).unlink(missing_ok=True)
+        
+        # Create all tables
+        Base.metadata.create_all(bind=engine)
+        print("✅ Created database tables")
+        
+        # Register sample users with dummy bank
+        print("\n📝 Registering sample users with dummy bank...")
+        # The seed password is hashed once in a worker thread while the registration
+        # is in flight, and shared by all users
+        names = ["John Doe", "Jane Smith"]
+        seed_password_hash, (john_customer_oid, jane_customer_oid) = await asyncio.gather(
+            asyncio.to_thread(get_password_hash, "password123", SEED_BCRYPT_ROUNDS),
+            register_customers(client, names, health.get("batch_supported", False))
+        )
+    
+    if not john_customer_oid or not jane_customer_oid:
+        print("❌ Failed to register users with dummy bank")
+        return
+    
+    # Create local database entries
+    print("\n💾 Creating local database entries...")
+    # The ORM work is blocking, so run it in a worker thread and keep the event loop free
+    await asyncio.to_thread(write_local_seed, john_customer_oid, jane_customer_oid, seed_password_hash)
+
 if __name__ == "__main__":
     print("🗄️ Resetting database with dummy bank integration...\n")
     asyncio.run(reset_database_with_dummy_bank())
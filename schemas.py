@@ -2,7 +2,7 @@
 Pydantic schemas for request/response models
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 from typing import Optional, List
 from datetime import datetime
 
@@ -21,8 +21,7 @@ class UserResponse(UserBase):
     is_active: bool
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Authentication schemas
 class Token(BaseModel):
@@ -48,8 +47,7 @@ class AccountResponse(AccountBase):
     created_at: datetime
     user_id: int
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Transaction schemas
 class TransactionBase(BaseModel):
@@ -68,8 +66,7 @@ class TransactionResponse(TransactionBase):
     status: str
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Banking request schemas
 class BalanceRequest(BaseModel):
@@ -77,3 +74,7 @@ class BalanceRequest(BaseModel):
 
 class AccountListResponse(BaseModel):
     accounts: List[AccountResponse]
+
+# List adapters: one compiled validator/serializer for a whole list of ORM rows
+AccountListAdapter = TypeAdapter(List[AccountResponse])
+TransactionListAdapter = TypeAdapter(List[TransactionResponse])
@@ -7,6 +7,10 @@ import asyncio
 import httpx
 
 BACKEND_URL = "http://localhost:8000"
+LOGIN_URL = f"{BACKEND_URL}/login"
+ME_URL = f"{BACKEND_URL}/me"
+ACCOUNTS_URL = f"{BACKEND_URL}/accounts"
+LOGOUT_URL = f"{BACKEND_URL}/logout"
 
 async def test_cookie_authentication():
     """Test cookie-based authentication"""
@@ -21,7 +25,7 @@ async def test_cookie_authentication():
         
         print("1. Testing login with JSON (sets HTTP-only cookie):")
         login_response = await client.post(
-            f"{BACKEND_URL}/login",
+            LOGIN_URL,
             json={
                 "username": username,
                 "password": password
@@ -50,7 +54,7 @@ async def test_cookie_authentication():
         
         print("2. Testing authenticated endpoint with cookie:")
         # The cookie should be automatically included in subsequent requests
-        me_response = await client.get(f"{BACKEND_URL}/me")
+        me_response = await client.get(ME_URL)
         
         if me_response.status_code == 200:
             user_info = me_response.json()
@@ -65,20 +69,20 @@ async def test_cookie_authentication():
         print("3. Testing other endpoints with cookie:")
         
         # Test accounts endpoint
-        accounts_response = await client.get(f"{BACKEND_URL}/accounts")
+        accounts_response = await client.get(ACCOUNTS_URL)
         if accounts_response.status_code == 200:
             accounts_data = accounts_response.json()
             accounts = accounts_data.get("accounts", [])
             print(f"   ✅ Accounts: Found {len(accounts)} accounts")
-            for account in accounts:
-                print(f"      - {account.get('account_name')}: ${account.get('balance'):,.2f}")
+            if accounts:
+                print("\n".join(f"      - {account['account_name']}: ${account['balance']:,.2f}" for account in accounts))
         else:
             print(f"   ❌ Accounts failed: {accounts_response.status_code}")
         
         print()
         
         print("4. Testing logout (clears cookie):")
-        logout_response = await client.post(f"{BACKEND_URL}/logout")
+        logout_response = await client.post(LOGOUT_URL)
         
         if logout_response.status_code == 200:
             logout_data = logout_response.json()
@@ -89,7 +93,7 @@ async def test_cookie_authentication():
         print()
         
         print("5. Testing endpoint after logout (should fail):")
-        me_after_logout = await client.get(f"{BACKEND_URL}/me")
+        me_after_logout = await client.get(ME_URL)
         
         if me_after_logout.status_code == 401:
             print(f"   ✅ Correctly rejected: {me_after_logout.status_code}")
@@ -101,7 +105,7 @@ async def test_cookie_authentication():
         print("6. Testing Bearer token authentication (should still work):")
         # Login again to get a token
         login_again = await client.post(
-            f"{BACKEND_URL}/login",
+            LOGIN_URL,
             json={"username": username, "password": password}
         )
         
@@ -110,7 +114,7 @@ async def test_cookie_authentication():
             
             # Test with Bearer token header
             headers = {"Authorization": f"Bearer {token}"}
-            bearer_response = await client.get(f"{BACKEND_URL}/me", headers=headers)
+            bearer_response = await client.get(ME_URL, headers=headers)
             
             if bearer_response.status_code == 200:
                 user_info = bearer_response.json()
@@ -8,6 +8,14 @@ import httpx
 
 BACKEND_URL = "http://localhost:8000"
 DUMMY_BANK_URL = "http://127.0.0.1:3000"
+HEALTH_URL = f"{BACKEND_URL}/health"
+DUMMY_BANK_HEALTH_URL = f"{DUMMY_BANK_URL}/health"
+REGISTER_URL = f"{BACKEND_URL}/register"
+TOKEN_URL = f"{BACKEND_URL}/token"
+BANK_STATUS_URL = f"{BACKEND_URL}/bank/status"
+BANK_PORTFOLIO_URL = f"{BACKEND_URL}/bank/portfolio"
+BANK_SYNC_URL = f"{BACKEND_URL}/bank/sync"
+BANK_CUSTOMERS_URL = f"{BACKEND_URL}/bank/customers"
 TEST_USERNAME = "bank_test_user"
 TEST_PASSWORD = "password123"
 
@@ -19,7 +27,7 @@ async def test_dummy_bank_integration():
         
         # 1. Check health including dummy bank status
         print("1. Checking system health (including dummy bank status):")
-        response = await client.get(f"{BACKEND_URL}/health")
+        response = await client.get(HEALTH_URL)
         if response.status_code == 200:
             health_data = response.json()
             print(f"   ✅ Backend: {health_data.get('status')}")
@@ -38,7 +46,7 @@ async def test_dummy_bank_integration():
         # 2. Check dummy bank directly
         print("2. Testing direct connection to dummy bank:")
         try:
-            response = await client.get(f"{DUMMY_BANK_URL}/health")
+            response = await client.get(DUMMY_BANK_HEALTH_URL)
             if response.status_code == 200:
                 bank_health = response.json()
                 print(f"   ✅ Dummy Bank Direct: {bank_health.get('status')}")
@@ -59,7 +67,7 @@ async def test_dummy_bank_integration():
             "password": TEST_PASSWORD
         }
         
-        response = await client.post(f"{BACKEND_URL}/register", json=user_data)
+        response = await client.post(REGISTER_URL, json=user_data)
         if response.status_code == 200:
             user_info = response.json()
             print(f"   ✅ User registered: {user_info.get('username')}")
@@ -83,7 +91,7 @@ async def test_dummy_bank_integration():
             "username": TEST_USERNAME,
             "password": TEST_PASSWORD
         }
-        response = await client.post(f"{BACKEND_URL}/token", data=login_data)
+        response = await client.post(TOKEN_URL, data=login_data)
         if response.status_code == 200:
             token_data = response.json()
             access_token = token_data["access_token"]
@@ -99,7 +107,7 @@ async def test_dummy_bank_integration():
         
         # 5. Check bank status
         print("5. Checking dummy bank connection status:")
-        response = await client.get(f"{BACKEND_URL}/bank/status", headers=headers)
+        response = await client.get(BANK_STATUS_URL, headers=headers)
         if response.status_code == 200:
             bank_status = response.json()
             print(f"   🏛️ Bank Status: {bank_status.get('status')}")
@@ -111,7 +119,7 @@ async def test_dummy_bank_integration():
         
         # 6. Get user portfolio from dummy bank
         print("6. Getting user portfolio from dummy bank:")
-        response = await client.get(f"{BACKEND_URL}/bank/portfolio", headers=headers)
+        response = await client.get(BANK_PORTFOLIO_URL, headers=headers)
         if response.status_code == 200:
             portfolio = response.json()
             print(f"   ✅ Portfolio retrieved successfully")
@@ -128,7 +136,7 @@ async def test_dummy_bank_integration():
             
             # Try manual sync
             print("   🔄 Attempting manual sync with dummy bank...")
-            sync_response = await client.post(f"{BACKEND_URL}/bank/sync", headers=headers)
+            sync_response = await client.post(BANK_SYNC_URL, headers=headers)
             if sync_response.status_code == 200:
                 sync_result = sync_response.json()
                 print(f"   ✅ Sync successful: {sync_result.get('message')}")
@@ -141,7 +149,7 @@ async def test_dummy_bank_integration():
         
         # 7. List all customers in dummy bank
         print("7. Listing all customers in dummy bank:")
-        response = await client.get(f"{BACKEND_URL}/bank/customers", headers=headers)
+        response = await client.get(BANK_CUSTOMERS_URL, headers=headers)
         if response.status_code == 200:
             customers = response.json()
             print(f"   ✅ Found {len(customers)} customers in dummy bank:")
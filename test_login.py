@@ -5,8 +5,73 @@ Demonstrates how to login to the banking backend
 
 import asyncio
 import httpx
+from typing import List
 
 BACKEND_URL = "http://localhost:8000"
+TOKEN_URL = f"{BACKEND_URL}/token"
+LOGIN_URL = f"{BACKEND_URL}/login"
+ME_URL = f"{BACKEND_URL}/me"
+
+async def login_user(client: httpx.AsyncClient, username: str, password: str) -> List[str]:
+    """Run both login methods for one user and return the report lines"""
+    lines = [f"Testing login for: {username}"]
+    
+    # Method 1: /token endpoint (OAuth2 standard - form data)
+    lines.append("  Method 1: POST /token (OAuth2 form data)")
+    try:
+        response = await client.post(
+            TOKEN_URL,
+            data={
+                "username": username,
+                "password": password
+            }
+        )
+        
+        if response.status_code == 200:
+            token_data = response.json()
+            access_token = token_data["access_token"]
+            lines.append(f"    ✅ Success: {access_token[:20]}...")
+        else:
+            lines.append(f"    ❌ Failed: {response.status_code} - {response.text}")
+    except Exception as e:
+        lines.append(f"    ❌ Error: {e}")
+    
+    # Method 2: /login endpoint (JSON data)
+    lines.append("  Method 2: POST /login (JSON data)")
+    try:
+        response = await client.post(
+            LOGIN_URL,
+            json={
+                "username": username,
+                "password": password
+            }
+        )
+        
+        if response.status_code == 200:
+            token_data = response.json()
+            access_token = token_data["access_token"]
+            lines.append(f"    ✅ Success: {access_token[:20]}...")
+            
+            # Test the token by getting user info
+            headers = {"Authorization": f"Bearer {access_token}"}
+            me_response = await client.get(ME_URL, headers=headers)
+            
+            if me_response.status_code == 200:
+                user_info = me_response.json()
+                lines.append(f"    👤 User Info: {user_info.get('full_name')} ({user_info.get('username')})")
+                if user_info.get('customer_oid'):
+                    lines.append(f"    🏛️ Customer OID: {user_info.get('customer_oid')}")
+                else:
+                    lines.append(f"    ⚠️ No Customer OID found")
+            else:
+                lines.append(f"    ❌ Failed to get user info: {me_response.status_code}")
+                
+        else:
+            lines.append(f"    ❌ Failed: {response.status_code} - {response.text}")
+    except Exception as e:
+        lines.append(f"    ❌ Error: {e}")
+    
+    return lines
 
 async def test_login_methods():
     """Test both login methods"""
@@ -19,69 +84,15 @@ async def test_login_methods():
     ]
     
     async with httpx.AsyncClient(timeout=10.0) as client:
-        
-        for user_creds in test_users:
-            username = user_creds["username"]
-            password = user_creds["password"]
-            
-            print(f"Testing login for: {username}")
-            
-            # Method 1: /token endpoint (OAuth2 standard - form data)
-            print("  Method 1: POST /token (OAuth2 form data)")
-            try:
-                response = await client.post(
-                    f"{BACKEND_URL}/token",
-                    data={
-                        "username": username,
-                        "password": password
-                    }
-                )
-                
-                if response.status_code == 200:
-                    token_data = response.json()
-                    access_token = token_data["access_token"]
-                    print(f"    ✅ Success: {access_token[:20]}...")
-                else:
-                    print(f"    ❌ Failed: {response.status_code} - {response.text}")
-            except Exception as e:
-                print(f"    ❌ Error: {e}")
-            
-            # Method 2: /login endpoint (JSON data)
-            print("  Method 2: POST /login (JSON data)")
-            try:
-                response = await client.post(
-                    f"{BACKEND_URL}/login",
-                    json={
-                        "username": username,
-                        "password": password
-                    }
-                )
-                
-                if response.status_code == 200:
-                    token_data = response.json()
-                    access_token = token_data["access_token"]
-                    print(f"    ✅ Success: {access_token[:20]}...")
-                    
-                    # Test the token by getting user info
-                    headers = {"Authorization": f"Bearer {access_token}"}
-                    me_response = await client.get(f"{BACKEND_URL}/me", headers=headers)
-                    
-                    if me_response.status_code == 200:
-                        user_info = me_response.json()
-                        print(f"    👤 User Info: {user_info.get('full_name')} ({user_info.get('username')})")
-                        if user_info.get('customer_oid'):
-                            print(f"    🏛️ Customer OID: {user_info.get('customer_oid')}")
-                        else:
-                            print(f"    ⚠️ No Customer OID found")
-                    else:
-                        print(f"    ❌ Failed to get user info: {me_response.status_code}")
-                        
-                else:
-                    print(f"    ❌ Failed: {response.status_code} - {response.text}")
-            except Exception as e:
-                print(f"    ❌ Error: {e}")
-            
-            print()
+        # Each user's calls depend on each other, but users are independent: run them concurrently
+        # and print each report as a block so the output doesn't interleave
+        reports = await asyncio.gather(
+            *(login_user(client, user["username"], user["password"]) for user in test_users)
+        )
+    
+    for lines in reports:
+        print("\n".join(lines))
+        print()
 
 if __name__ == "__main__":
     print("🏦 Banking Backend Login Test")
@@ -0,0 +1,35 @@
+"""
+Short-lived cache for the result of one async call
+Lets frequent health probes reuse a recent status check
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+# How long a status check result is reused (seconds)
+STATUS_TTL = 2.0
+
+class TimedCache:
+    """Holds one result and reuses it until ttl seconds have passed"""
+    
+    def __init__(self, ttl: float = STATUS_TTL):
+        self.ttl = ttl
+        self._cached_at = 0.0
+        self._value = None
+        self._lock = asyncio.Lock()
+    
+    def _fresh(self) -> bool:
+        """True while the cached result is younger than ttl"""
+        return self._value is not None and time.monotonic() - self._cached_at < self.ttl
+    
+    async def get(self, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached result, or await compute() and cache what it returns"""
+        if self._fresh():
+            return self._value
+        # One caller recomputes; the others wait and reuse its result
+        async with self._lock:
+            if not self._fresh():
+                self._value = await compute()
+                self._cached_at = time.monotonic()
+            return self._value